@@ -0,0 +1,196 @@
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+# Admission control for the LLM endpoints.
+# Each endpoint gets a controller with a fixed number of concurrent LLM calls and a bounded
+# wait queue. Waiters are grouped per client IP and served round-robin, so one
+# noisy client can't starve everyone else. A request is rejected immediately (503 +
+# Retry-After) when the queue is full, or when its deadline (X-Request-Timeout, covering
+# both the wait and the LLM call) would likely expire before the call finishes, so we never
+# pay for a provider call whose answer nobody will wait for.
+
+
+class Overloaded(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, name: str, max_concurrency: int = 8, max_queue: int = 32,
+                 queue_timeout: float = 10.0, max_queue_per_client: Optional[int] = None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_queue_per_client = max_queue_per_client or max(1, max_queue // 4)
+
+        self._active = 0
+        self._queued = 0
+        # client -> waiting futures; iteration order is the round-robin order.
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        # Exponentially weighted average of how long a slot is held.
+        self._service_time: Optional[float] = None
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def estimated_wait(self, position: int) -> Optional[float]:
+        """Rough wait for the `position`-th queued request, None until we've seen a call finish."""
+        if self._service_time is None:
+            return None
+        return math.ceil(position / self.max_concurrency) * self._service_time
+
+    def retry_after(self) -> int:
+        wait = self.estimated_wait(self._queued + 1)
+        return max(1, math.ceil(wait if wait is not None else self.queue_timeout))
+
+    def _misses_deadline(self, wait: float, deadline: Optional[float]) -> bool:
+        return deadline is not None and self._service_time is not None and wait + self._service_time > deadline
+
+    def _reject(self, message: str):
+        self.rejected += 1
+        raise Overloaded(message, self.retry_after())
+
+    def _grant_next(self):
+        while self._active < self.max_concurrency and self._waiters:
+            client, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._waiters.move_to_end(client)
+            else:
+                del self._waiters[client]
+            if future.done():
+                # Timed out or cancelled while waiting.
+                continue
+            self._active += 1
+            future.set_result(None)
+
+    def _remove_waiter(self, client: str, future: asyncio.Future):
+        queue = self._waiters.get(client)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        self._queued -= 1
+        if not queue:
+            del self._waiters[client]
+
+    async def acquire(self, client: str, timeout: Optional[float] = None):
+        # `timeout` is the caller's end-to-end deadline; nan/inf mean none.
+        deadline = timeout if timeout is not None and math.isfinite(timeout) else None
+        if self._active < self.max_concurrency and not self._waiters:
+            if self._misses_deadline(0.0, deadline):
+                self._reject(f"{self.name} request can't finish within its deadline.")
+            self._active += 1
+            self.admitted += 1
+            return
+
+        # Never wait longer than queue_timeout, whatever the caller asked for.
+        budget = self.queue_timeout if deadline is None else max(0.0, min(deadline, self.queue_timeout))
+        if self._queued >= self.max_queue:
+            self._reject(f"{self.name} queue is full.")
+        if len(self._waiters.get(client, ())) >= self.max_queue_per_client:
+            self._reject(f"Too many queued {self.name} requests from this client.")
+        estimate = self.estimated_wait(self._queued + 1)
+        if budget <= 0 or (estimate is not None and estimate > budget) or self._misses_deadline(estimate or 0.0, deadline):
+            self._reject(f"{self.name} is overloaded.")
+
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(client, deque()).append(future)
+        self._queued += 1
+        try:
+            await asyncio.wait_for(future, budget)
+        except asyncio.TimeoutError:
+            self._remove_waiter(client, future)
+            if future.done() and not future.cancelled():
+                self.release()
+            self.timed_out += 1
+            self._reject(f"Timed out waiting for a {self.name} slot.")
+        except asyncio.CancelledError:
+            self._remove_waiter(client, future)
+            if future.done() and not future.cancelled():
+                # We were granted a slot right as the caller went away; hand it on.
+                self.release()
+            raise
+
+        if deadline is not None and self._misses_deadline(0.0, deadline - (time.monotonic() - start)):
+            # Waited longer than estimated; what's left of the deadline won't cover the call.
+            self.release()
+            self._reject(f"{self.name} request can't finish within its deadline.")
+        self.admitted += 1
+
+    def release(self, service_time: Optional[float] = None):
+        if service_time is not None:
+            if self._service_time is None:
+                self._service_time = service_time
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+        self._active -= 1
+        self._grant_next()
+
+    @asynccontextmanager
+    async def slot(self, client: str, timeout: Optional[float] = None):
+        await self.acquire(client, timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def snapshot(self) -> Dict:
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "avg_service_time": self._service_time,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+def client_key(http_request: Request) -> str:
+    """
+    Fairness key for a request: the client IP.
+    Headers such as X-API-Key aren't authenticated here, so a client could send a fresh value
+    per request to dodge the per-client queue limit. Behind reverse proxies (e.g. Hugging Face
+    Spaces) the connecting IP is the proxy's, so with TRUSTED_PROXY_HOPS=N the client IP is
+    taken from X-Forwarded-For, N entries from the right: the entries our own proxies
+    appended. Anything further left was sent by the client and could be spoofed.
+    """
+    hops = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+    if hops > 0:
+        forwarded = [h.strip() for h in ",".join(http_request.headers.getlist("x-forwarded-for")).split(",") if h.strip()]
+        if len(forwarded) >= hops:
+            return f"ip:{forwarded[-hops]}"
+    return f"ip:{http_request.client.host if http_request.client else 'unknown'}"
+
+
+def request_timeout(http_request: Request) -> Optional[float]:
+    """Client-supplied deadline in seconds (X-Request-Timeout); ignored unless finite."""
+    try:
+        timeout = float(http_request.headers["x-request-timeout"])
+    except (KeyError, ValueError):
+        return None
+    return timeout if math.isfinite(timeout) else None
+
+
+async def run_admitted(limiter: AdmissionController, http_request: Request, fn, *args):
+    """Runs blocking `fn(*args)` in the threadpool once `limiter` admits the request; 503 otherwise."""
+    try:
+        async with limiter.slot(client_key(http_request), request_timeout(http_request)):
+            return await run_in_threadpool(fn, *args)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
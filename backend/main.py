@@ -1,6 +1,6 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
 import os
@@ -14,8 +14,16 @@ from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 # Import Vector Engine
 try:
     from vector_engine import VectorEngine
+    from admission import AdmissionController, run_admitted
+    from static_files import PrecompressedStaticFiles
+    from user_profiles import ProfileStore
+    from structured_output import invoke_structured, stats as output_stats
 except ImportError:
     from .vector_engine import VectorEngine
+    from .admission import AdmissionController, run_admitted
+    from .static_files import PrecompressedStaticFiles
+    from .user_profiles import ProfileStore
+    from .structured_output import invoke_structured, stats as output_stats
 
 load_dotenv()
 
@@ -38,6 +46,8 @@ if os.path.exists(json_path):
     print("Ingesting/Updating concepts...")
     engine.ingest_concepts(json_path)
 
+profiles = ProfileStore(os.path.join(base_dir, "profiles"), embed_fn=engine.embed)
+
 # Models
 class BridgeRequest(BaseModel):
     known_domain: str
@@ -59,6 +69,12 @@ class QA(BaseModel):
     question: str
     answer: str
 
+class ProfileTopicsRequest(BaseModel):
+    topics: List[str]
+
+class ProfileQARequest(BaseModel):
+    qa_list: List[QA]
+
 class PlanRequest(BaseModel):
     known_domain: str
     target_domain: str
@@ -82,8 +98,29 @@ def get_llm():
     else:
         return None
 
+def use_structured_output():
+    # "structured" (default) uses the provider's native JSON-schema output,
+    # "parser" keeps the old free-text + JsonOutputParser path.
+    return os.getenv("LLM_OUTPUT_MODE", "structured") != "parser"
+
+# Admission control: cap concurrent LLM calls per endpoint and shed load with 503s
+# instead of letting a spike pile up until the provider throttles every request.
+limiters = {
+    name: AdmissionController(
+        name,
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+        queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "10")),
+    )
+    for name in ("bridge", "generate_questions", "generate_plan")
+}
+
+async def run_llm(endpoint: str, http_request: Request, fn, *args):
+    """Runs a blocking LLM call in the threadpool once the endpoint's limiter admits it."""
+    return await run_admitted(limiters[endpoint], http_request, fn, *args)
+
 @app.post("/bridge")
-async def generate_bridge(request: BridgeRequest):
+async def generate_bridge(request: BridgeRequest, http_request: Request):
     llm = get_llm()
     if not llm:
         raise HTTPException(status_code=500, detail="LLM API key not configured.")
@@ -115,13 +152,15 @@ async def generate_bridge(request: BridgeRequest):
     chain = prompt | llm | StrOutputParser()
 
     try:
-        result = chain.invoke({})
+        result = await run_llm("bridge", http_request, chain.invoke, {})
         return {"result": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/generate_questions", response_model=QuestionResponse)
-async def generate_questions(request: QuestionRequest):
+async def generate_questions(request: QuestionRequest, http_request: Request):
     llm = get_llm()
     if not llm:
         raise HTTPException(status_code=500, detail="LLM API key not configured.")
@@ -137,21 +176,28 @@ async def generate_questions(request: QuestionRequest):
         """)
     ])
 
-    chain = prompt | llm | parser
+    inputs = {
+        "known_domain": request.known_domain,
+        "target_domain": request.target_domain,
+        "focus": request.focus or "general concepts",
+    }
 
     try:
-        result = chain.invoke({
-            "known_domain": request.known_domain,
-            "target_domain": request.target_domain,
-            "focus": request.focus or "general concepts",
-            "format_instructions": parser.get_format_instructions()
-        })
-        return result
+        if use_structured_output():
+            result = await run_llm("generate_questions", http_request, invoke_structured,
+                                   llm, prompt, {**inputs, "format_instructions": ""}, QuestionResponse)
+            # Already validated against QuestionResponse, skip FastAPI's second validation pass.
+            return JSONResponse(result.model_dump())
+        chain = prompt | llm | parser
+        return await run_llm("generate_questions", http_request, chain.invoke,
+                             {**inputs, "format_instructions": parser.get_format_instructions()})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/generate_plan", response_model=PlanResponse)
-async def generate_plan(request: PlanRequest):
+async def generate_plan(request: PlanRequest, http_request: Request):
     llm = get_llm()
     if not llm:
         raise HTTPException(status_code=500, detail="LLM API key not configured.")
@@ -173,18 +219,63 @@ async def generate_plan(request: PlanRequest):
         """)
     ])
 
-    chain = prompt | llm | parser
+    inputs = {
+        "known_domain": request.known_domain,
+        "target_domain": request.target_domain,
+        "focus": request.focus or "general concepts",
+        "qa_text": qa_text,
+    }
 
     try:
-        result = chain.invoke({
-            "known_domain": request.known_domain,
-            "target_domain": request.target_domain,
-            "focus": request.focus or "general concepts",
-            "qa_text": qa_text,
-            "format_instructions": parser.get_format_instructions()
-        })
-        return result
+        if use_structured_output():
+            result = await run_llm("generate_plan", http_request, invoke_structured,
+                                   llm, prompt, {**inputs, "format_instructions": ""}, PlanResponse)
+            # Already validated against PlanResponse, skip FastAPI's second validation pass.
+            return JSONResponse(result.model_dump())
+        chain = prompt | llm | parser
+        return await run_llm("generate_plan", http_request, chain.invoke,
+                             {**inputs, "format_instructions": parser.get_format_instructions()})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
+# Profile endpoints embed and query the vector store synchronously, so they are plain
+# `def` handlers and FastAPI runs them in the threadpool instead of on the event loop.
+@app.post("/profiles/{user_id}/topics")
+def add_profile_topics(user_id: str, request: ProfileTopicsRequest):
+    try:
+        profile = profiles.add_topics(user_id, request.topics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"user_id": user_id, "topics": profile.topics, "seen": profile.seen_count}
+
+@app.post("/profiles/{user_id}/qa")
+def add_profile_qa(user_id: str, request: ProfileQARequest):
+    try:
+        profile = profiles.add_qa(user_id, [qa.model_dump() for qa in request.qa_list])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"user_id": user_id, "topics": profile.topics, "seen": profile.seen_count}
+
+@app.post("/profiles/{user_id}/epiphany")
+def profile_epiphany(user_id: str):
+    try:
+        concept = profiles.recommend(engine, user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if concept is None:
+        raise HTTPException(status_code=404, detail="No unseen concepts left for this profile.")
+    return concept
+
+@app.get("/stats/admission")
+async def admission_stats():
+    return {name: limiter.snapshot() for name, limiter in limiters.items()}
+
+@app.get("/stats/structured_output")
+async def structured_output_stats():
+    return output_stats.snapshot()
+
+app.mount("/", PrecompressedStaticFiles(directory="static", html=True), name="static")
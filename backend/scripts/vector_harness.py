@@ -0,0 +1,365 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from chromadb import EmbeddingFunction
+
+# Add backend to sys.path so we can import the engine when run as a script
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vector_engine import VectorEngine
+
+# Offline quality/latency regression harness for VectorEngine.
+#
+#   python scripts/vector_harness.py                    # compare against the stored baseline
+#   python scripts/vector_harness.py --update-baseline  # record a new baseline
+#
+# Everything runs on CPU without network access: instead of the default MiniLM model
+# (which Chroma downloads on first use) concepts are embedded with a deterministic
+# feature-hashing embedder. Absolute quality numbers are therefore only comparable to
+# baselines recorded with the same embedder, which is exactly what a regression check needs.
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+REAL_CORPUS_PATH = os.path.join(BASE_DIR, "data/concepts.json")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "vector_baseline.json")
+
+# find_unknown_unknown picks the furthest of this many nearest neighbours.
+CANDIDATES = 20
+
+HAND_WRITTEN_QUERIES = [
+    ["Software Engineering", "Coding", "React"],
+    ["Economics", "Markets", "Pricing"],
+    ["Biology", "Evolution", "Genetics"],
+    ["Physics", "Thermodynamics", "Energy"],
+    ["History", "Empires", "War"],
+    ["Philosophy", "Ethics", "Logic"],
+    ["Psychology", "Decision Making", "Bias"],
+    ["Systems Thinking", "Feedback Loops"],
+    ["Statistics", "Probability", "Risk"],
+    ["Design", "User Experience"],
+]
+
+MODES = ("topics", "centroid")
+
+SYNTHETIC_DOMAINS = {
+    "Economics": ["market", "price", "incentive", "trade", "supply", "demand", "cost", "capital"],
+    "Biology": ["cell", "gene", "evolution", "species", "organism", "adaptation", "protein", "ecosystem"],
+    "Physics": ["energy", "entropy", "force", "mass", "field", "wave", "momentum", "equilibrium"],
+    "History": ["empire", "war", "dynasty", "revolution", "treaty", "colony", "trade route", "collapse"],
+    "Philosophy": ["ethics", "logic", "knowledge", "truth", "virtue", "paradox", "mind", "argument"],
+    "Psychology": ["bias", "memory", "habit", "attention", "emotion", "perception", "heuristic", "motivation"],
+    "Systems Thinking": ["feedback", "loop", "stock", "flow", "leverage", "delay", "emergence", "network"],
+    "Mathematics": ["proof", "graph", "probability", "function", "symmetry", "limit", "set", "optimization"],
+}
+
+
+def _generated_queries(n: int = 30, seed: int = 1) -> List[List[str]]:
+    rng = random.Random(seed)
+    domains = list(SYNTHETIC_DOMAINS)
+    queries = []
+    for i in range(n):
+        domain = domains[i % len(domains)]
+        queries.append([domain.title()] + [w.title() for w in rng.sample(SYNTHETIC_DOMAINS[domain], 2)])
+    return queries
+
+
+# Chroma's HNSW index isn't built deterministically, so a single query can flip between
+# near-tied neighbours from run to run. A larger fixed query set, averaged over several
+# index builds (see run()), keeps the metrics stable enough to compare against a baseline.
+QUERIES = HAND_WRITTEN_QUERIES + _generated_queries()
+
+DEFAULT_THRESHOLDS = {
+    # Latency/memory may grow by this factor (plus absolute slack for timer/allocator noise).
+    "latency_ratio": 1.5,
+    "latency_slack_ms": 5.0,
+    "memory_ratio": 1.5,
+    "memory_slack_kb": 256.0,
+    # Quality metrics (higher is better) may drop by at most this much.
+    "quality_drop": {
+        "recall": 0.05,
+        "utility_mean": 1.0,
+        "domain_diversity": 0.15,
+    },
+    # The recommendation should stay "far but related": distance metrics may move at most
+    # this much in either direction (closer = not an unknown, farther = random/irrelevant).
+    "distance_band": {
+        "distance_mean": 0.15,
+        "distance_percentile": 0.05,
+    },
+}
+
+LATENCY_METRICS = ("latency_p50_ms", "latency_p95_ms", "latency_p99_ms")
+# peak_memory_kb is Python heap only (tracemalloc); Chroma's HNSW index and query buffers
+# live in native memory, which rss_growth_kb and index_size_kb cover. rss_growth_kb is how
+# far a corpus run (index builds + queries) pushes the process's peak RSS above where it
+# was after imports; every corpus runs in a fresh process so it only sees its own peak.
+MEMORY_METRICS = ("peak_memory_kb", "rss_growth_kb", "index_size_kb")
+
+
+class HashingEmbeddingFunction(EmbeddingFunction):
+    """Deterministic bag-of-words + bigram feature hashing, L2-normalized."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        tokens = re.findall(r"[a-z0-9]+", text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.md5(feature.encode()).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def __call__(self, input):
+        return [self._embed(text) for text in input]
+
+    @staticmethod
+    def name() -> str:
+        return "blindspot-hashing"
+
+    def get_config(self) -> Dict:
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config: Dict) -> "HashingEmbeddingFunction":
+        return HashingEmbeddingFunction(config.get("dim", 256))
+
+
+def synthetic_concepts(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    domains = list(SYNTHETIC_DOMAINS)
+    concepts = []
+    for i in range(n):
+        domain = domains[i % len(domains)]
+        words = rng.sample(SYNTHETIC_DOMAINS[domain], 3)
+        concepts.append({
+            "name": f"{words[0].title()} {words[1].title()} Principle {i}",
+            "domain": domain,
+            "explanation": f"How {words[0]} shapes {words[1]} through {words[2]} in {domain.lower()}.",
+            "utility": rng.randint(1, 10),
+        })
+    return concepts
+
+
+def load_corpora(names: List[str]) -> Dict[str, List[Dict]]:
+    corpora = {}
+    for name in names:
+        if name == "real":
+            with open(REAL_CORPUS_PATH, 'r') as f:
+                corpora[name] = json.load(f)
+        elif name.startswith("synthetic_"):
+            corpora[name] = synthetic_concepts(int(name.split("_", 1)[1]))
+        else:
+            raise ValueError(f"Unknown corpus: {name}")
+    return corpora
+
+
+def build_engine(concepts: List[Dict], workdir: str, embedder: EmbeddingFunction) -> VectorEngine:
+    json_path = os.path.join(workdir, "concepts.json")
+    with open(json_path, 'w') as f:
+        json.dump(concepts, f)
+    engine = VectorEngine(persist_path=os.path.join(workdir, "chroma_db"), embedding_fn=embedder)
+    engine.ingest_concepts(json_path)
+    return engine
+
+
+def _max_rss_kb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return rss / 1024 if sys.platform == "darwin" else float(rss)
+
+
+def _dir_size_kb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1024
+
+
+def _query_vector(engine: VectorEngine, topics: List[str], mode: str) -> np.ndarray:
+    if mode == "topics":
+        return np.asarray(engine.embed([", ".join(topics)])[0], dtype=np.float32)
+    return np.asarray(engine.embed(topics), dtype=np.float32).mean(axis=0)
+
+
+def _recommend(engine: VectorEngine, topics: List[str], mode: str, query: np.ndarray) -> Optional[Dict]:
+    if mode == "topics":
+        return engine.find_unknown_unknown(topics)
+    return engine.find_unknown_unknown(topics, query_embedding=query)
+
+
+def evaluate(engine: VectorEngine, concepts: List[Dict], mode: str, repeats: int = 5) -> Dict[str, float]:
+    stored = engine.collection.get(include=["embeddings"])
+    ids = stored["ids"]
+    matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+    by_name = {c["name"]: c for c in concepts}
+    k = min(CANDIDATES, len(ids))
+
+    latencies, recalls, percentiles, distances, utilities, domains = [], [], [], [], [], []
+    peak = 0
+    tracemalloc.start()
+    for topics in QUERIES:
+        query = _query_vector(engine, topics, mode)
+
+        # Only the recommendation calls count towards latency and peak memory.
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = _recommend(engine, topics, mode, query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+
+        # Exact brute force (squared L2, same space as the collection).
+        exact = ((matrix - query) ** 2).sum(axis=1)
+        exact_top = {ids[i] for i in np.argsort(exact)[:k]}
+        ann_top = set(engine.collection.query(query_embeddings=[query.tolist()], n_results=k)["ids"][0])
+        recalls.append(len(exact_top & ann_top) / k)
+
+        if result is None:
+            continue
+        distance = float(exact[ids.index(result["name"])])
+        distances.append(distance)
+        percentiles.append(float((exact < distance).mean()))
+        utilities.append(by_name[result["name"]]["utility"])
+        domains.append(result["domain"])
+    tracemalloc.stop()
+
+    return {
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "latency_p99_ms": float(np.percentile(latencies, 99)),
+        "peak_memory_kb": peak / 1024,
+        "recall": float(np.mean(recalls)),
+        "distance_mean": float(np.mean(distances)) if distances else 0.0,
+        "distance_percentile": float(np.mean(percentiles)) if percentiles else 0.0,
+        "utility_mean": float(np.mean(utilities)) if utilities else 0.0,
+        # Distinct domains recommended, relative to the most that were possible.
+        "domain_diversity": len(set(domains)) / min(len(QUERIES), len({c["domain"] for c in concepts})),
+    }
+
+
+def run_corpus(name: str, repeats: int = 5, builds: int = 3) -> Dict[str, Dict[str, float]]:
+    """Metrics per mode for one corpus, averaged over `builds` independently built indexes."""
+    concepts = load_corpora([name])[name]
+    embedder = HashingEmbeddingFunction()
+    start_rss = _max_rss_kb()
+    runs = {mode: [] for mode in MODES}
+    for _ in range(builds):
+        with tempfile.TemporaryDirectory() as workdir:
+            engine = build_engine(concepts, workdir, embedder)
+            for mode in MODES:
+                metrics = evaluate(engine, concepts, mode, repeats)
+                metrics["index_size_kb"] = _dir_size_kb(os.path.join(workdir, "chroma_db"))
+                runs[mode].append(metrics)
+    rss_growth = _max_rss_kb() - start_rss
+
+    results = {}
+    for mode, mode_runs in runs.items():
+        results[mode] = {metric: float(np.mean([r[metric] for r in mode_runs])) for metric in mode_runs[0]}
+        # Measured over the whole corpus run, the index is shared by both modes.
+        results[mode]["rss_growth_kb"] = rss_growth
+    return results
+
+
+def run(corpus_names: List[str], repeats: int = 5, builds: int = 3) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Metrics per corpus and mode. Each corpus runs in its own process (see MEMORY_METRICS)."""
+    results = {}
+    for name in corpus_names:
+        load_corpora([name])  # Fail fast on unknown corpus names.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[name] = pool.submit(run_corpus, name, repeats, builds).result()
+    return results
+
+
+def compare(results: Dict, baseline: Dict) -> List[str]:
+    """Returns a human readable line for every metric that regressed past its threshold."""
+    thresholds = {**DEFAULT_THRESHOLDS, **baseline.get("thresholds", {})}
+    quality_drop = {**DEFAULT_THRESHOLDS["quality_drop"], **thresholds.get("quality_drop", {})}
+    distance_band = {**DEFAULT_THRESHOLDS["distance_band"], **thresholds.get("distance_band", {})}
+    failures = []
+
+    for corpus, modes in baseline.get("results", {}).items():
+        for mode, expected in modes.items():
+            actual = results.get(corpus, {}).get(mode)
+            label = f"{corpus}/{mode}"
+            if actual is None:
+                failures.append(f"{label}: missing from results")
+                continue
+
+            for metric in LATENCY_METRICS:
+                limit = expected[metric] * thresholds["latency_ratio"] + thresholds["latency_slack_ms"]
+                if actual[metric] > limit:
+                    failures.append(f"{label}: {metric} {actual[metric]:.2f} > {limit:.2f}")
+
+            for metric in MEMORY_METRICS:
+                limit = expected[metric] * thresholds["memory_ratio"] + thresholds["memory_slack_kb"]
+                if actual[metric] > limit:
+                    failures.append(f"{label}: {metric} {actual[metric]:.0f} > {limit:.0f}")
+
+            for metric, drop in quality_drop.items():
+                floor = expected[metric] - drop
+                if actual[metric] < floor:
+                    failures.append(f"{label}: {metric} {actual[metric]:.3f} < {floor:.3f}")
+
+            for metric, tolerance in distance_band.items():
+                low, high = expected[metric] - tolerance, expected[metric] + tolerance
+                if not low <= actual[metric] <= high:
+                    failures.append(f"{label}: {metric} {actual[metric]:.3f} outside [{low:.3f}, {high:.3f}]")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline VectorEngine quality/latency regression harness.")
+    parser.add_argument("--corpora", nargs="+", default=["real", "synthetic_500", "synthetic_2000"])
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per query.")
+    parser.add_argument("--builds", type=int, default=3, help="Independent index builds to average over.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = run(args.corpora, args.repeats, args.builds)
+    print(json.dumps(results, indent=2))
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({"thresholds": DEFAULT_THRESHOLDS, "results": results}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline first.")
+        return 1
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    # Only check corpora we actually ran.
+    baseline["results"] = {k: v for k, v in baseline.get("results", {}).items() if k in results}
+    failures = compare(results, baseline)
+    if failures:
+        print("Regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import os
+import sys
+import stat
+import gzip
+import hashlib
+import tempfile
+import mimetypes
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Static serving for the exported frontend build.
+# Assets are precompressed once (at image build via `python static_files.py static`, or
+# at startup if the directory is writable) into `.br` / `.gz` sidecar files, so a page
+# load is a plain file send instead of compressing the bundle on every request.
+# Range requests, HEAD and If-None-Match/If-Modified-Since come from Starlette's
+# FileResponse. It also sends files with the ASGI `http.response.pathsend` extension
+# (zero-copy sendfile) when the server supports it (e.g. Hypercorn, Granian); under
+# Uvicorn it falls back to chunked reads in a worker thread.
+# Everything that touches the disk (stat calls, hashing for ETags) runs in lookup_path, which
+# Starlette already calls in a worker thread, so file_response never blocks the event loop.
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".html", ".css", ".js", ".mjs", ".json", ".map", ".svg", ".txt", ".xml", ".ico", ".wasm",
+}
+MIN_COMPRESS_SIZE = 1024
+
+# Build output directories whose file names are content-hashed (Vite, Next.js export).
+# Files there never change under the same URL, so they can be cached forever. HTML pages
+# are always revalidated, wherever they live.
+HASHED_ASSET_DIRS = ("assets/", "_next/static/")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preferred order when the client accepts several encodings.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# (encoding, path, stat, etag) of a file we can send; encoding is None for the original.
+Variant = Tuple[Optional[str], str, os.stat_result, str]
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress_directory(directory: str) -> int:
+    """
+    Writes `.br` / `.gz` sidecars for compressible files that don't have an up to date one.
+    Sidecars that aren't smaller than the original are skipped. Returns the number written.
+    """
+    written = 0
+    encodings = [enc for enc in ENCODINGS if enc[0] != "br" or brotli is not None]
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            stat_result = os.stat(path)
+            if stat_result.st_size < MIN_COMPRESS_SIZE:
+                continue
+
+            data = None
+            for encoding, suffix in encodings:
+                sidecar = path + suffix
+                if os.path.exists(sidecar) and os.stat(sidecar).st_mtime >= stat_result.st_mtime:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                compressed = _compress(data, encoding)
+                if len(compressed) >= len(data):
+                    continue
+                # Write-then-rename: an interrupted write or a second worker precompressing
+                # at the same time must never leave a truncated sidecar that looks up to date.
+                fd, tmp_path = tempfile.mkstemp(dir=root, prefix=f".{name}.", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(compressed)
+                    os.replace(tmp_path, sidecar)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+                written += 1
+    return written
+
+
+def is_hashed_asset(relative_path: str) -> bool:
+    if relative_path.lower().endswith((".html", ".htm")):
+        return False
+    return relative_path.startswith(HASHED_ASSET_DIRS)
+
+
+def _accepted_encodings(request_headers: Headers) -> Dict[str, float]:
+    accepted = {}
+    for part in request_headers.get("accept-encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+    return accepted
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def __init__(self, *args, precompress: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._etags: Dict[Tuple[str, float, int], str] = {}
+        # (path, mtime, size) of an original file -> variants to choose from, filled by lookup_path.
+        self._variants: Dict[Tuple[str, float, int], List[Variant]] = {}
+        if self.directory and os.path.isdir(self.directory):
+            if precompress:
+                try:
+                    precompress_directory(str(self.directory))
+                except OSError:
+                    # Read-only deployment; rely on sidecars generated at build time.
+                    pass
+            self._warm(str(self.directory))
+
+    def _warm(self, directory: str):
+        # Hash everything up front so a first request doesn't have to read a whole file for its ETag.
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.realpath(os.path.join(root, name))
+                if not self._is_sidecar(path):
+                    self._prepare(path, os.stat(path))
+
+    @staticmethod
+    def _is_sidecar(full_path: str) -> bool:
+        for _, suffix in ENCODINGS:
+            original = full_path[:-len(suffix)]
+            if (full_path.endswith(suffix) and os.path.splitext(original)[1].lower() in COMPRESSIBLE_EXTENSIONS
+                    and os.path.isfile(original)):
+                return True
+        return False
+
+    def _strong_etag(self, path: str, stat_result: os.stat_result) -> str:
+        """Content-hash ETag, cached per (path, mtime, size)."""
+        key = (path, stat_result.st_mtime, stat_result.st_size)
+        etag = self._etags.get(key)
+        if etag is None:
+            digest = hashlib.md5(usedforsecurity=False)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            etag = f'"{digest.hexdigest()}"'
+            self._etags[key] = etag
+        return etag
+
+    def _prepare(self, full_path: str, stat_result: os.stat_result) -> List[Variant]:
+        """Stats and hashes the original and its up to date sidecars (blocking, run off the loop)."""
+        variants = []
+        if os.path.splitext(full_path)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+            for encoding, suffix in ENCODINGS:
+                try:
+                    sidecar_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                if sidecar_stat.st_mtime >= stat_result.st_mtime:
+                    variants.append((encoding, full_path + suffix, sidecar_stat,
+                                     self._strong_etag(full_path + suffix, sidecar_stat)))
+        variants.append((None, full_path, stat_result, self._strong_etag(full_path, stat_result)))
+        self._variants[(full_path, stat_result.st_mtime, stat_result.st_size)] = variants
+        return variants
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+            if self._is_sidecar(full_path):
+                # Sidecars are only sent as an encoding of their original, never as files of their own.
+                return "", None
+            self._prepare(full_path, stat_result)
+        return full_path, stat_result
+
+    def _select_variant(self, variants: List[Variant], request_headers: Headers) -> Variant:
+        accepted = _accepted_encodings(request_headers)
+        for variant in variants:
+            encoding = variant[0]
+            if encoding is None or accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return variant
+        return variants[-1]
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        is_compressible = os.path.splitext(full_path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+        variants = self._variants.get((full_path, stat_result.st_mtime, stat_result.st_size))
+        if variants is None:
+            # Not looked up through lookup_path; only happens when called directly.
+            variants = self._prepare(full_path, stat_result)
+        encoding, send_path, send_stat, etag = self._select_variant(variants, request_headers)
+
+        headers = {"etag": etag}
+        if encoding:
+            headers["content-encoding"] = encoding
+        if is_compressible:
+            headers["vary"] = "Accept-Encoding"
+
+        relative_path = os.path.relpath(full_path, os.path.realpath(self.directory)).replace(os.sep, "/")
+        if is_hashed_asset(relative_path):
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            headers["cache-control"] = REVALIDATE_CACHE_CONTROL
+
+        response = FileResponse(
+            send_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=mimetypes.guess_type(full_path)[0] or "text/plain",
+            stat_result=send_stat,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    # Build step: python static_files.py <directory>
+    target = sys.argv[1] if len(sys.argv) > 1 else "static"
+    count = precompress_directory(target)
+    print(f"Precompressed {count} files in {target}.")
@@ -0,0 +1,307 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+# Structured output for the JSON endpoints.
+# Instead of asking for free text and running it through JsonOutputParser, we bind the
+# Pydantic schema to the provider's native JSON-schema output mode. When the provider
+# hands back something that does not validate, we try to fix it locally first
+# (code fences, trailing commas, surrounding prose) and only go back to the LLM for the
+# fragment that is still broken, e.g. a single schedule item. Output that was cut off is
+# never accepted as is (closing it would silently drop what didn't fit): the LLM is asked
+# again, together with the original task, for the complete answer.
+
+MAX_FRAGMENT_REPROMPTS = 3
+
+FRAGMENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You repair JSON so that it matches a JSON schema. Reply with the corrected JSON only."),
+    ("user", """The following JSON fragment is invalid:
+    {fragment}
+
+    Validation error:
+    {error}
+
+    It must match this JSON schema:
+    {schema}
+    """)
+])
+
+RETRY_PROMPT = ChatPromptTemplate.from_messages([
+    ("user", """Your previous reply could not be used:
+    {error}
+
+    Reply again with the complete answer as JSON only. It must match this JSON schema:
+    {schema}
+    """)
+])
+
+
+class StructuredOutputError(Exception):
+    pass
+
+
+class OutputStats:
+    """Thread-safe counters for how often structured output needed fixing."""
+
+    FIELDS = ("calls", "native_ok", "parse_failures", "local_repairs", "fragment_reprompts", "fragment_repairs",
+              "task_reprompts", "task_repairs", "failures")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = {field: 0 for field in self.FIELDS}
+
+    def incr(self, field: str, amount: int = 1):
+        with self._lock:
+            self._counts[field] += amount
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            counts = dict(self._counts)
+        calls = counts["calls"] or 1
+        counts["parse_failure_rate"] = counts["parse_failures"] / calls
+        counts["local_repair_rate"] = counts["local_repairs"] / calls
+        counts["fragment_repair_rate"] = counts["fragment_repairs"] / calls
+        counts["task_repair_rate"] = counts["task_repairs"] / calls
+        counts["failure_rate"] = counts["failures"] / calls
+        return counts
+
+
+stats = OutputStats()
+
+
+def _message_text(message: Any) -> str:
+    content = getattr(message, "content", message)
+    if isinstance(content, list):
+        # Some providers (Gemini) return a list of content blocks.
+        return "".join(block if isinstance(block, str) else block.get("text", "") for block in content)
+    return content or ""
+
+
+MAX_TRUNCATION_CUTS = 32
+
+
+def _scan_json(text: str) -> Tuple[str, bool, List[str], List[Tuple[int, List[str]]]]:
+    """
+    Single string-aware pass over (possibly broken) JSON.
+    Returns the text with trailing commas removed, whether it ends inside a string, the
+    closers still needed, and the places where the last member could be cut off (each with
+    the closers needed at that point). Commas and brackets inside strings are left alone.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    cuts: List[Tuple[int, List[str]]] = []
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            cuts.append((len(out), list(stack)))
+            continue
+        elif ch in "}]" and stack:
+            stack.pop()
+        elif ch == ",":
+            j = i + 1
+            while j < len(text) and text[j].isspace():
+                j += 1
+            if j < len(text) and text[j] in "}]":
+                # Trailing comma.
+                continue
+            cuts.append((len(out), list(stack)))
+        out.append(ch)
+    return "".join(out), in_string, stack, cuts
+
+
+def _close_truncated(text: str) -> Optional[Any]:
+    """Closes output that was cut off. A member cut off mid-string is dropped, not kept half-written."""
+    cleaned, in_string, stack, cuts = _scan_json(text)
+    candidates = [] if in_string else [cleaned + "".join(reversed(stack))]
+    for pos, cut_stack in reversed(cuts[-MAX_TRUNCATION_CUTS:]):
+        candidates.append(cleaned[:pos] + "".join(reversed(cut_stack)))
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+OPENING_FENCE = re.compile(r"^```[A-Za-z]*\s*")
+CLOSING_FENCE = re.compile(r"\s*```\s*$")
+
+
+def _json_start(text: str) -> int:
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    return min(starts) if starts else -1
+
+
+def _parse(text: str) -> Tuple[Optional[Any], bool]:
+    """
+    Like repair_json, but also says whether the value had to be closed after being cut off
+    (in which case it is missing whatever didn't fit).
+    """
+    if not text:
+        return None, False
+
+    text = text.strip()
+    start = _json_start(text)
+    if start == -1:
+        return None, False
+    # Only treat backticks as a markdown fence when the value starts inside one; backticks
+    # after the value or inside its strings are content.
+    fence = text.rfind("```", 0, start)
+    if fence != -1:
+        text = CLOSING_FENCE.sub("", OPENING_FENCE.sub("", text[fence:], count=1), count=1)
+        start = _json_start(text)
+    text = text[start:]
+
+    # Complete value, possibly with trailing commas or followed by prose (which may
+    # contain braces or a closing fence of its own).
+    cleaned = _scan_json(text)[0]
+    try:
+        return json.JSONDecoder().raw_decode(cleaned)[0], False
+    except json.JSONDecodeError:
+        pass
+
+    return _close_truncated(text), True
+
+
+def repair_json(text: str) -> Optional[Any]:
+    """
+    Best-effort local repair of malformed LLM JSON.
+    Handles markdown code fences, leading/trailing prose, trailing commas and output
+    that was cut off mid-object. Returns the parsed value, or None if nothing worked.
+    """
+    return _parse(text)[0]
+
+
+def _reprompt_fragment(llm, fragment: Any, error: str, schema: Dict) -> Optional[Any]:
+    stats.incr("fragment_reprompts")
+    message = (FRAGMENT_PROMPT | llm).invoke({
+        "fragment": fragment if isinstance(fragment, str) else json.dumps(fragment),
+        "error": error,
+        "schema": json.dumps(schema),
+    })
+    data, truncated = _parse(_message_text(message))
+    return None if truncated else data
+
+
+def _reprompt_task(llm, prompt: ChatPromptTemplate, inputs: Dict, previous: str, error: str,
+                   schema: Type[BaseModel]) -> BaseModel:
+    """Asks for the whole answer again, with the original task and the unusable reply in context."""
+    stats.incr("task_reprompts")
+    messages = prompt.format_messages(**inputs) + [AIMessage(content=previous)] + RETRY_PROMPT.format_messages(
+        error=error, schema=json.dumps(schema.model_json_schema()),
+    )
+    data, truncated = _parse(_message_text(llm.invoke(messages)))
+    if data is None or truncated:
+        raise StructuredOutputError("LLM returned output that could not be repaired.")
+    return schema.model_validate(data)
+
+
+def _item_schema(schema: Type[BaseModel], field: str) -> Optional[Dict]:
+    """JSON schema of the items of a list field, if they are themselves a model."""
+    full = schema.model_json_schema()
+    items = full.get("properties", {}).get(field, {}).get("items", {})
+    ref = items.get("$ref")
+    if not ref:
+        return None
+    definition = full.get("$defs", {}).get(ref.split("/")[-1])
+    return definition
+
+
+def _repair_invalid(llm, prompt: ChatPromptTemplate, inputs: Dict, data: Any, schema: Type[BaseModel],
+                    error: ValidationError) -> Tuple[BaseModel, str]:
+    """
+    Re-asks the LLM only for the parts of `data` that failed validation.
+    Errors located inside a list item of a model list (e.g. schedule[3]) are fixed item by
+    item; anything else falls back to asking for the whole answer again. Returns the
+    validated result and the stats counter it counts towards.
+    """
+    if isinstance(data, dict):
+        broken_items = {}
+        for err in error.errors():
+            loc = err["loc"]
+            if len(loc) >= 2 and isinstance(loc[1], int) and isinstance(data.get(loc[0]), list):
+                broken_items.setdefault((loc[0], loc[1]), []).append(err["msg"])
+            else:
+                broken_items = None
+                break
+
+        if broken_items and len(broken_items) <= MAX_FRAGMENT_REPROMPTS:
+            for (field, index), messages in broken_items.items():
+                item_schema = _item_schema(schema, field)
+                if item_schema is None:
+                    break
+                fixed = _reprompt_fragment(llm, data[field][index], "; ".join(messages), item_schema)
+                if fixed is None:
+                    break
+                data[field][index] = fixed
+            else:
+                return schema.model_validate(data), "fragment_repairs"
+
+    return _reprompt_task(llm, prompt, inputs, json.dumps(data), str(error), schema), "task_repairs"
+
+
+def invoke_structured(llm, prompt: ChatPromptTemplate, inputs: Dict, schema: Type[BaseModel]) -> BaseModel:
+    """
+    Runs `prompt | llm` using the provider's native structured output for `schema`.
+    Returns a validated instance of `schema`; raises StructuredOutputError if the output
+    could not be repaired.
+    """
+    stats.incr("calls")
+    chain = prompt | llm.with_structured_output(schema, include_raw=True)
+    output = chain.invoke(inputs)
+
+    parsed = output.get("parsed")
+    if parsed is not None:
+        stats.incr("native_ok")
+        return parsed if isinstance(parsed, schema) else schema.model_validate(parsed)
+
+    stats.incr("parse_failures")
+    raw_text = _message_text(output.get("raw"))
+
+    try:
+        data, truncated = _parse(raw_text)
+        if data is None:
+            # Empty (e.g. a safety block or MAX_TOKENS before any output) or not JSON at all:
+            # there is nothing to repair, and a reprompt would only make up an answer.
+            raise StructuredOutputError("LLM returned output that could not be parsed as JSON.")
+
+        if truncated:
+            result = _reprompt_task(llm, prompt, inputs, raw_text, "The reply was cut off before the JSON was complete.", schema)
+            stats.incr("task_repairs")
+            return result
+
+        try:
+            result = schema.model_validate(data)
+            stats.incr("local_repairs")
+            return result
+        except ValidationError as e:
+            result, counter = _repair_invalid(llm, prompt, inputs, data, schema, e)
+            stats.incr(counter)
+            return result
+    except (StructuredOutputError, ValidationError) as e:
+        stats.incr("failures")
+        if isinstance(e, StructuredOutputError):
+            raise
+        raise StructuredOutputError(str(e)) from e
@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from backend.admission import AdmissionController, Overloaded, client_key, request_timeout, run_admitted
+
+
+async def fake_llm_call(limiter, client, results, duration=0.05, timeout=None):
+    try:
+        async with limiter.slot(client, timeout):
+            await asyncio.sleep(duration)
+            results.append(client)
+    except Overloaded as e:
+        results.append(("rejected", client, e.retry_after))
+
+
+def test_concurrency_and_queue_limits():
+    async def run():
+        limiter = AdmissionController("test", max_concurrency=2, max_queue=2, max_queue_per_client=2)
+        results = []
+        await asyncio.gather(*(fake_llm_call(limiter, f"c{i}", results) for i in range(6)))
+        return limiter, results
+
+    limiter, results = asyncio.run(run())
+    rejected = [r for r in results if isinstance(r, tuple)]
+    assert len(rejected) == 2
+    assert all(retry_after >= 1 for _, _, retry_after in rejected)
+    assert limiter.snapshot()["active"] == 0
+    assert limiter.snapshot()["queued"] == 0
+
+
+def test_waiters_are_served_round_robin_per_client():
+    async def run():
+        limiter = AdmissionController("test", max_concurrency=1, max_queue=10, max_queue_per_client=5)
+        results = []
+        tasks = [asyncio.create_task(fake_llm_call(limiter, "first", results))]
+        await asyncio.sleep(0)
+        # A noisy client queues four requests before a quiet one queues a single request.
+        for _ in range(4):
+            tasks.append(asyncio.create_task(fake_llm_call(limiter, "noisy", results, duration=0.01)))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(fake_llm_call(limiter, "quiet", results, duration=0.01)))
+        await asyncio.gather(*tasks)
+        return results
+
+    results = asyncio.run(run())
+    assert results[:3] == ["first", "noisy", "quiet"]
+
+
+def test_requests_past_their_deadline_are_shed():
+    async def run():
+        limiter = AdmissionController("test", max_concurrency=1, max_queue=10, queue_timeout=5)
+        results = []
+        # Teach the limiter that calls take ~0.2s.
+        await fake_llm_call(limiter, "warmup", results, duration=0.2)
+        start = time.monotonic()
+        await asyncio.gather(
+            fake_llm_call(limiter, "a", results, duration=0.2),
+            fake_llm_call(limiter, "b", results, timeout=0.05),
+        )
+        return results, time.monotonic() - start
+
+    results, elapsed = asyncio.run(run())
+    assert ("rejected", "b", 1) in results
+    assert elapsed < 0.5
+
+
+def test_non_finite_deadlines_fall_back_to_queue_timeout():
+    async def run():
+        limiter = AdmissionController("test", max_concurrency=1, max_queue=10, queue_timeout=0.2)
+        results = []
+        await asyncio.gather(
+            fake_llm_call(limiter, "a", results, duration=1.0),
+            fake_llm_call(limiter, "b", results, timeout=float("nan")),
+            fake_llm_call(limiter, "c", results, timeout=float("inf")),
+        )
+        return results
+
+    results = asyncio.run(run())
+    rejected = {r[1] for r in results if isinstance(r, tuple)}
+    assert rejected == {"b", "c"}
+
+    request = Request({"type": "http", "headers": [(b"x-request-timeout", b"nan")]})
+    assert request_timeout(request) is None
+
+
+def test_deadline_covers_the_call_not_just_the_wait():
+    async def run():
+        limiter = AdmissionController("test", max_concurrency=1, max_queue=10, queue_timeout=5)
+        results = []
+        await fake_llm_call(limiter, "warmup", results, duration=0.2)
+        await asyncio.gather(
+            fake_llm_call(limiter, "a", results, duration=0.2),
+            # Would get a slot after ~0.2s, but the call itself needs another ~0.2s.
+            fake_llm_call(limiter, "b", results, timeout=0.3),
+        )
+        # An idle slot doesn't help a deadline shorter than a call.
+        await fake_llm_call(limiter, "c", results, timeout=0.1)
+        return results
+
+    results = asyncio.run(run())
+    assert {r[1] for r in results if isinstance(r, tuple)} == {"b", "c"}
+
+
+def test_time_spent_waiting_counts_against_the_deadline():
+    async def run():
+        limiter = AdmissionController("test", max_concurrency=1, max_queue=10, queue_timeout=5)
+        results = []
+        await fake_llm_call(limiter, "warmup", results, duration=0.1)
+        started = []
+
+        async def tracked(client, **kwargs):
+            try:
+                async with limiter.slot(client, kwargs.get("timeout")):
+                    started.append(client)
+                    await asyncio.sleep(kwargs.get("duration", 0.05))
+            except Overloaded:
+                results.append(("rejected", client))
+
+        # "a" runs much longer than the 0.1s estimate, so "b" (queued with a 0.3s deadline)
+        # only gets its slot when ~0.05s of that deadline are left.
+        await asyncio.gather(tracked("a", duration=0.25), tracked("b", timeout=0.3))
+        return results, started, limiter
+
+    results, started, limiter = asyncio.run(run())
+    assert ("rejected", "b") in results
+    assert started == ["a"]
+    assert limiter.snapshot()["active"] == 0
+
+
+def test_client_key_uses_trusted_proxy_hops(monkeypatch):
+    def request(forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "headers": headers, "client": ("10.0.0.1", 1234)})
+
+    assert client_key(request("1.2.3.4")) == "ip:10.0.0.1"
+    monkeypatch.setenv("TRUSTED_PROXY_HOPS", "1")
+    # The proxy appends the address it saw; anything before it came from the client.
+    assert client_key(request("6.6.6.6, 1.2.3.4")) == "ip:1.2.3.4"
+    assert client_key(request()) == "ip:10.0.0.1"
+
+
+def test_endpoint_sheds_load_under_overload():
+    # Fake LLM: every call blocks for 0.3s, like a slow provider.
+    chain = (ChatPromptTemplate.from_messages([("user", "bridge")])
+             | FakeListChatModel(responses=["A bridge."], sleep=0.3)
+             | StrOutputParser())
+    limiter = AdmissionController("bridge", max_concurrency=2, max_queue=2, queue_timeout=2)
+
+    app = FastAPI()
+
+    @app.post("/bridge")
+    async def bridge(http_request: Request):
+        return {"result": await run_admitted(limiter, http_request, chain.invoke, {})}
+
+    async def spike():
+        async def call(i):
+            # One client per IP, so per-client fairness doesn't come into play.
+            transport = httpx.ASGITransport(app=app, client=(f"10.0.0.{i}", 1234))
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                start = time.monotonic()
+                response = await ac.post("/bridge")
+                return response, time.monotonic() - start
+        return await asyncio.gather(*(call(i) for i in range(12)))
+
+    results = asyncio.run(spike())
+    accepted = [(r, t) for r, t in results if r.status_code == 200]
+    shed = [(r, t) for r, t in results if r.status_code == 503]
+
+    assert len(accepted) + len(shed) == len(results)
+    assert len(accepted) == 4  # 2 running + 2 queued
+    assert all(int(r.headers["Retry-After"]) >= 1 for r, _ in shed)
+    # Rejections are immediate and accepted requests wait at most one extra LLM call.
+    assert max(t for _, t in shed) < 0.2
+    assert max(t for _, t in accepted) < 1.0
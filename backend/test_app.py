@@ -1,4 +1,6 @@
 
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from backend.main import app
@@ -27,6 +29,44 @@ def test_generate_plan_validation_error():
     response = client.post("/generate_plan", json={})
     assert response.status_code == 422
 
+def test_profile_endpoints(monkeypatch, tmp_path):
+    import backend.main as main
+
+    monkeypatch.setattr(main, "profiles", main.ProfileStore(str(tmp_path), embed_fn=lambda texts: [[1.0, 0.0] for _ in texts]))
+
+    assert client.post("/profiles/bad id!/epiphany").status_code == 400
+    assert client.post("/profiles/new-user/epiphany").status_code == 404
+
+    response = client.post("/profiles/new-user/topics", json={"topics": ["Coding", "React", "Coding"]})
+    assert response.status_code == 200
+    assert response.json()["topics"] == ["Coding", "React"]
+
+    response = client.post("/profiles/new-user/qa", json={"qa_list": [{"question": "q", "answer": "a"}]})
+    assert response.status_code == 200
+    assert main.profiles.get("new-user").count == 3
+
+def test_structured_endpoints(monkeypatch):
+    import backend.main as main
+    from backend.test_structured_output import FakeStructuredLLM
+
+    monkeypatch.setenv("LLM_OUTPUT_MODE", "structured")
+    request = {"known_domain": "Coding", "target_domain": "Biology"}
+
+    monkeypatch.setattr(main, "get_llm", lambda: FakeStructuredLLM(responses=[], raw='```json\n{"questions": ["q1", "q2",]}\n```'))
+    response = client.post("/generate_questions", json=request)
+    assert response.status_code == 200
+    assert response.json() == {"questions": ["q1", "q2"]}
+
+    item = {"time": "09:00 AM", "activity": "Read", "description": "Intro", "resource_type": "Article"}
+    monkeypatch.setattr(main, "get_llm", lambda: FakeStructuredLLM(responses=[], raw=json.dumps({"schedule": [item]})))
+    response = client.post("/generate_plan", json={**request, "qa_list": [{"question": "q", "answer": "a"}]})
+    assert response.status_code == 200
+    assert response.json() == {"schedule": [item]}
+
+    monkeypatch.setattr(main, "get_llm", lambda: FakeStructuredLLM(responses=[], raw=""))
+    response = client.post("/generate_questions", json=request)
+    assert response.status_code == 500
+
 # Note: Valid calls require an API key.
 # If I had a way to mock the chain.invoke, I would.
 # For now, these basic tests ensure the app structure is correct.
@@ -0,0 +1,91 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.static_files import PrecompressedStaticFiles, is_hashed_asset, precompress_directory
+
+BUNDLE = "console.log('blindspot');\n" * 200
+
+
+def make_client(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "index-B4xKz3a9.js").write_text(BUNDLE)
+    (tmp_path / "index.html").write_text("<html>" + "x" * 2000 + "</html>")
+    app = FastAPI()
+    app.mount("/", PrecompressedStaticFiles(directory=str(tmp_path), html=True), name="static")
+    return TestClient(app)
+
+
+def test_precompressed_variant_and_cache_headers(tmp_path):
+    client = make_client(tmp_path)
+    assert (tmp_path / "assets" / "index-B4xKz3a9.js.gz").exists()
+
+    response = client.get("/assets/index-B4xKz3a9.js", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert "javascript" in response.headers["content-type"]
+    assert response.text == BUNDLE
+
+    index = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in index.headers
+    assert index.headers["cache-control"] == "no-cache"
+
+
+def test_conditional_and_range_requests(tmp_path):
+    client = make_client(tmp_path)
+    first = client.get("/assets/index-B4xKz3a9.js", headers={"Accept-Encoding": "identity"})
+    etag = first.headers["etag"]
+    assert not etag.startswith("W/")
+
+    cached = client.get("/assets/index-B4xKz3a9.js",
+                        headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert cached.status_code == 304
+
+    partial = client.get("/assets/index-B4xKz3a9.js",
+                         headers={"Accept-Encoding": "identity", "Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.content == BUNDLE.encode()[:10]
+
+
+def test_precompress_skips_small_and_up_to_date_files(tmp_path):
+    (tmp_path / "small.js").write_text("x")
+    (tmp_path / "big.css").write_text("body { color: red; }\n" * 200)
+    assert precompress_directory(str(tmp_path)) >= 1
+    assert not (tmp_path / "small.js.gz").exists()
+    assert gzip.decompress((tmp_path / "big.css.gz").read_bytes()).decode().startswith("body")
+    assert precompress_directory(str(tmp_path)) == 0
+
+
+def test_immutable_caching_follows_build_asset_directories():
+    assert is_hashed_asset("assets/index-abcdefgh.js")
+    assert is_hashed_asset("assets/vendor-a1b2-c3d4.css")
+    assert is_hashed_asset("_next/static/chunks/main-1a2b3c.js")
+    assert not is_hashed_asset("privacy-policy2025.html")
+    assert not is_hashed_asset("assets/embedded.html")
+    assert not is_hashed_asset("logo-12345678.svg")
+
+
+def test_precompress_leaves_no_temp_files(tmp_path):
+    (tmp_path / "big.js").write_text("var x = 1;\n" * 300)
+    precompress_directory(str(tmp_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["big.js", "big.js.br", "big.js.gz"]
+
+
+def test_sidecars_are_not_served_directly(tmp_path):
+    client = make_client(tmp_path)
+    (tmp_path / "archive.tar.gz").write_bytes(gzip.compress(b"data"))
+    for suffix in (".gz", ".br"):
+        assert client.get("/assets/index-B4xKz3a9.js" + suffix, headers={"Accept-Encoding": "gzip"}).status_code == 404
+    # A .gz file without an original next to it is an ordinary file.
+    assert client.get("/archive.tar.gz").status_code == 200
+
+
+def test_file_changed_after_startup_gets_a_fresh_etag(tmp_path):
+    client = make_client(tmp_path)
+    (tmp_path / "late.txt").write_text("first")
+    first = client.get("/late.txt").headers["etag"]
+    (tmp_path / "late.txt").write_text("second version")
+    assert client.get("/late.txt").headers["etag"] != first
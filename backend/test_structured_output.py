@@ -0,0 +1,133 @@
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+from typing import List
+
+import pytest
+
+from backend.structured_output import StructuredOutputError, invoke_structured, repair_json, stats
+
+
+class Item(BaseModel):
+    time: str
+    activity: str
+
+class Plan(BaseModel):
+    schedule: List[Item]
+
+class Questions(BaseModel):
+    questions: List[str]
+
+
+class FakeStructuredLLM(FakeListChatModel):
+    """Returns `raw` from the structured-output call and `responses` from any reprompt."""
+    raw: str = ""
+    prompts: List[str] = []
+
+    def _call(self, messages, *args, **kwargs):
+        self.prompts.append("\n".join(str(m.content) for m in messages))
+        return super()._call(messages, *args, **kwargs)
+
+    def with_structured_output(self, schema, include_raw=False, **kwargs):
+        def run(_):
+            try:
+                parsed = schema.model_validate_json(self.raw)
+            except Exception:
+                parsed = None
+            return {"raw": AIMessage(content=self.raw), "parsed": parsed, "parsing_error": None}
+        return RunnableLambda(run)
+
+
+prompt = ChatPromptTemplate.from_messages([("user", "Ask me about {topic}")])
+
+
+def test_repair_json_handles_fences_trailing_commas_and_truncation():
+    assert repair_json('```json\n{"questions": ["a", "b",]}\n```') == {"questions": ["a", "b"]}
+    assert repair_json('Sure! {"questions": ["a"]} Hope that helps.') == {"questions": ["a"]}
+    assert repair_json('{"questions": ["a", "b') == {"questions": ["a"]}
+    assert repair_json("no json here") is None
+
+
+def test_repair_json_leaves_string_contents_alone():
+    text = '{"questions": ["What does [a, ] mean?", "Is {x,} valid?", "b",]}'
+    assert repair_json(text) == {"questions": ["What does [a, ] mean?", "Is {x,} valid?", "b"]}
+
+
+def test_repair_json_only_treats_leading_backticks_as_a_fence():
+    text = '{"questions": ["Explain ```code``` blocks", "b",]}'
+    assert repair_json(text) == {"questions": ["Explain ```code``` blocks", "b"]}
+    assert repair_json('{"questions": ["a"]}\n```\nNote: {x}') == {"questions": ["a"]}
+    assert repair_json('Here it is:\n```json\n{"questions": ["a",\n```') == {"questions": ["a"]}
+
+
+def test_repair_json_drops_member_truncated_inside_key():
+    text = '{"schedule": [{"time": "9", "activity": "Read"}, {"time": "10", "activ'
+    assert repair_json(text) == {"schedule": [{"time": "9", "activity": "Read"}, {"time": "10"}]}
+    assert repair_json('{"questions": ["a", "b"], "no') == {"questions": ["a", "b"]}
+
+
+def test_repair_json_ignores_trailing_prose_with_braces():
+    assert repair_json('{"questions": ["a"]} and also {"b": 1}') == {"questions": ["a"]}
+    assert repair_json('Here you go: [1, 2,] (see {notes})') == [1, 2]
+
+
+def test_native_output_needs_no_repair():
+    stats.reset()
+    llm = FakeStructuredLLM(responses=[], raw='{"questions": ["q1"]}')
+    assert invoke_structured(llm, prompt, {"topic": "x"}, Questions).questions == ["q1"]
+    assert stats.snapshot()["native_ok"] == 1
+
+
+def test_malformed_output_is_repaired_locally():
+    stats.reset()
+    llm = FakeStructuredLLM(responses=[], raw='```json\n{"questions": ["q1", "q2",]}\n```')
+    assert invoke_structured(llm, prompt, {"topic": "x"}, Questions).questions == ["q1", "q2"]
+    snapshot = stats.snapshot()
+    assert snapshot["parse_failures"] == 1
+    assert snapshot["local_repairs"] == 1
+    assert snapshot["fragment_reprompts"] == 0
+
+
+def test_only_broken_item_is_reprompted():
+    stats.reset()
+    raw = '{"schedule": [{"time": "9", "activity": "Read"}, {"time": "10"}]}'
+    llm = FakeStructuredLLM(responses=['{"time": "10", "activity": "Practice"}'], raw=raw)
+    result = invoke_structured(llm, prompt, {"topic": "x"}, Plan)
+    assert [item.activity for item in result.schedule] == ["Read", "Practice"]
+    snapshot = stats.snapshot()
+    assert snapshot["fragment_reprompts"] == 1
+    assert snapshot["fragment_repairs"] == 1
+
+
+@pytest.mark.parametrize("raw", ['{"questions": ["What is the role of', '{"questions": ['])
+def test_truncated_output_is_asked_again_with_the_task(raw):
+    stats.reset()
+    llm = FakeStructuredLLM(responses=['{"questions": ["q1", "q2"]}'], raw=raw, prompts=[])
+    assert invoke_structured(llm, prompt, {"topic": "tides"}, Questions).questions == ["q1", "q2"]
+    assert "Ask me about tides" in llm.prompts[0]
+    snapshot = stats.snapshot()
+    assert snapshot["local_repairs"] == 0
+    assert snapshot["task_reprompts"] == 1
+    assert snapshot["task_repairs"] == 1
+
+
+def test_truncated_retry_is_not_accepted():
+    stats.reset()
+    llm = FakeStructuredLLM(responses=['{"questions": ["q1", "q'], raw='{"questions": ["a", "b', prompts=[])
+    with pytest.raises(StructuredOutputError):
+        invoke_structured(llm, prompt, {"topic": "x"}, Questions)
+    assert stats.snapshot()["failures"] == 1
+
+
+@pytest.mark.parametrize("raw", ["", "I can't help with that."])
+def test_empty_or_non_json_output_is_not_reprompted(raw):
+    stats.reset()
+    llm = FakeStructuredLLM(responses=['{"questions": ["made up"]}'], raw=raw, prompts=[])
+    with pytest.raises(StructuredOutputError):
+        invoke_structured(llm, prompt, {"topic": "x"}, Questions)
+    assert llm.prompts == []
+    snapshot = stats.snapshot()
+    assert snapshot["failures"] == 1
+    assert snapshot["task_reprompts"] == snapshot["fragment_reprompts"] == 0
@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.user_profiles import ProfileStore, UserProfile
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def test_centroid_is_updated_incrementally(tmp_path):
+    embed = CountingEmbedder()
+    store = ProfileStore(str(tmp_path), embed_fn=embed)
+
+    store.add_topics("alice", ["ab", "abcd"])
+    store.add_topics("alice", ["abcd", "abcdef"])
+    profile = store.get("alice")
+
+    # Only the new topic is embedded on the second call.
+    assert embed.calls == [["ab", "abcd"], ["abcdef"]]
+    assert profile.topics == ["ab", "abcd", "abcdef"]
+    np.testing.assert_allclose(profile.centroid, [4.0, 1.0])
+
+    store.add_qa("alice", [{"question": "q", "answer": "a"}])
+    assert store.get("alice").count == 4
+
+
+def test_seen_bitmap_and_persistence(tmp_path):
+    store = ProfileStore(str(tmp_path), embed_fn=CountingEmbedder())
+    store.add_topics("bob", ["x"])
+    store.mark_seen("bob", "Hormesis")
+    store.mark_seen("bob", "Lindy Effect")
+
+    reloaded = ProfileStore(str(tmp_path), embed_fn=CountingEmbedder())
+    profile = reloaded.get("bob")
+    assert reloaded.is_seen(profile, "Hormesis")
+    assert reloaded.is_seen(profile, "Lindy Effect")
+    assert not reloaded.is_seen(profile, "Comparative Advantage")
+    assert profile.seen_count == 2
+    assert profile.topics == ["x"]
+
+
+def test_bitmap_grows_on_demand():
+    profile = UserProfile("carol")
+    profile.mark_seen(17)
+    assert len(profile.seen) == 3
+    assert profile.is_seen(17)
+    assert not profile.is_seen(16)
+    assert not profile.is_seen(1000)
+
+
+def test_profile_cache_is_bounded_and_skips_unknown_users(tmp_path):
+    store = ProfileStore(str(tmp_path), embed_fn=CountingEmbedder(), max_cached=2)
+    for i in range(100):
+        assert store.get(f"stranger-{i}").centroid is None
+    assert len(store._profiles) == 0
+
+    for user in ("a", "b", "c"):
+        store.add_topics(user, ["x"])
+    assert list(store._profiles) == ["b", "c"]
+    # Evicted profiles are reloaded from disk.
+    assert store.get("a").topics == ["x"]
+    assert list(store._profiles) == ["c", "a"]
+
+
+def test_concurrent_updates_to_one_profile_are_not_lost(tmp_path):
+    class SlowEmbedder(CountingEmbedder):
+        def __call__(self, texts):
+            time.sleep(0.02)
+            return super().__call__(texts)
+
+    embed = SlowEmbedder()
+    store = ProfileStore(str(tmp_path), embed_fn=embed)
+    # Concurrent first writes for a user that doesn't exist yet, half of them repeating a topic.
+    batches = [["shared"] if i % 2 else [f"topic-{i}"] for i in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda topics: store.add_topics("dave", topics), batches))
+
+    profile = ProfileStore(str(tmp_path), embed_fn=CountingEmbedder()).get("dave")
+    assert sorted(profile.topics) == sorted(["shared"] + [f"topic-{i}" for i in range(0, 8, 2)])
+    assert profile.count == 5
+    assert sum(len(call) for call in embed.calls) == 5
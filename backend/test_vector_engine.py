@@ -0,0 +1,37 @@
+import pytest
+
+from backend.scripts.vector_harness import HashingEmbeddingFunction, build_engine, synthetic_concepts
+from backend.user_profiles import ProfileStore
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # 90 concepts forces the unseen-candidate search to widen past the first 20/40/80 results.
+    return build_engine(synthetic_concepts(90), str(tmp_path), HashingEmbeddingFunction())
+
+
+def test_exclude_skips_seen_concepts(engine):
+    query = engine.embed(["Economics, Market, Price"])[0]
+    first = engine.find_unknown_unknown([], query_embedding=query)
+    second = engine.find_unknown_unknown([], query_embedding=query,
+                                         exclude=lambda concept_id: concept_id == first["name"])
+    assert second["name"] != first["name"]
+    assert engine.find_unknown_unknown([], query_embedding=query, exclude=lambda concept_id: True) is None
+
+
+def test_profile_recommendations_cover_every_concept_once(engine, tmp_path):
+    profiles = ProfileStore(str(tmp_path / "profiles"), embed_fn=engine.embed)
+    with pytest.raises(LookupError):
+        profiles.recommend(engine, "dana")
+
+    profiles.add_topics("dana", ["Software Engineering", "Coding", "React"])
+    seen = []
+    while True:
+        concept = profiles.recommend(engine, "dana")
+        if concept is None:
+            break
+        seen.append(concept["name"])
+
+    assert len(seen) == engine.collection.count()
+    assert len(set(seen)) == len(seen)
+    assert profiles.get("dana").seen_count == len(seen)
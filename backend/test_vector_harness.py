@@ -0,0 +1,44 @@
+import copy
+
+from backend.scripts.vector_harness import MODES, compare, run
+
+
+def test_harness_runs_offline_and_flags_regressions():
+    results = run(["synthetic_60"], repeats=1, builds=1)
+    metrics = results["synthetic_60"]
+    assert set(metrics) == set(MODES)
+    for mode_metrics in metrics.values():
+        assert 0.0 <= mode_metrics["recall"] <= 1.0
+        assert 0.0 < mode_metrics["domain_diversity"] <= 1.0
+        assert 1 <= mode_metrics["utility_mean"] <= 10
+        assert mode_metrics["latency_p50_ms"] <= mode_metrics["latency_p99_ms"]
+        assert mode_metrics["rss_growth_kb"] >= 0
+        assert mode_metrics["index_size_kb"] > 0
+
+    baseline = {"results": copy.deepcopy(results)}
+    assert compare(results, baseline) == []
+
+    regressed = copy.deepcopy(results)
+    regressed["synthetic_60"]["topics"]["recall"] -= 0.2
+    regressed["synthetic_60"]["centroid"]["latency_p95_ms"] *= 10
+    regressed["synthetic_60"]["centroid"]["latency_p95_ms"] += 100
+    failures = compare(regressed, baseline)
+    assert len(failures) == 2
+    assert any("topics: recall" in f for f in failures)
+    assert any("centroid: latency_p95_ms" in f for f in failures)
+
+
+def test_distance_band_is_two_sided():
+    expected = {metric: 1.0 for metric in (
+        "latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "peak_memory_kb", "rss_growth_kb",
+        "index_size_kb", "recall", "utility_mean", "domain_diversity")}
+    expected.update(distance_mean=1.0, distance_percentile=0.05)
+    baseline = {"results": {"real": {"topics": expected}}}
+
+    # Suddenly recommending the farthest concept in the corpus must fail, not just getting closer.
+    farther = {**expected, "distance_mean": 2.0, "distance_percentile": 0.95}
+    closer = {**expected, "distance_mean": 0.5, "distance_percentile": 0.0}
+    for actual in (farther, closer):
+        failures = compare({"real": {"topics": actual}}, baseline)
+        assert any("distance_mean" in f for f in failures)
+    assert any("distance_percentile" in f for f in compare({"real": {"topics": farther}}, baseline))
@@ -0,0 +1,212 @@
+import os
+import re
+import json
+import base64
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Persistent per-user profiles for the Unknown Unknowns recommender.
+# A profile keeps a running mean of the embeddings of everything the user told us about
+# (topics and answered diagnostic questions), so a recommendation query never has to
+# re-embed the whole topic list. Concepts already shown to the user are tracked in a
+# bitmap over integer concept ids, so excluding them costs one bit per concept.
+#
+# Layout on disk (one small file per user so updates don't rewrite everyone):
+#   <persist_dir>/_concepts.json      append-only concept name -> bit index
+#   <persist_dir>/<user_id>.json      centroid, count, topics, seen bitmap
+
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+# Profiles kept in memory; everything is persisted on update, so evicting is free.
+MAX_CACHED_PROFILES = 1024
+
+# Updates to one profile (read, embed, save) are serialized by a lock picked by user id.
+# A fixed set of striped locks keeps memory bounded however many users there are.
+USER_LOCK_STRIPES = 64
+
+
+def _write_json(path: str, data):
+    # Write-then-rename so a crash never leaves a torn file behind.
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class UserProfile:
+    def __init__(self, user_id: str, centroid: Optional[np.ndarray] = None, count: int = 0,
+                 topics: Optional[List[str]] = None, seen: Optional[bytearray] = None):
+        self.user_id = user_id
+        self.centroid = centroid
+        self.count = count
+        self.topics = topics or []
+        self.seen = seen or bytearray()
+
+    def add_embeddings(self, vectors: np.ndarray):
+        """Folds new embeddings into the running centroid without touching old ones."""
+        if len(vectors) == 0:
+            return
+        total = vectors.sum(axis=0)
+        if self.centroid is None:
+            self.centroid = total / len(vectors)
+        else:
+            self.centroid = (self.centroid * self.count + total) / (self.count + len(vectors))
+        self.count += len(vectors)
+
+    def mark_seen(self, index: int):
+        byte, bit = divmod(index, 8)
+        if byte >= len(self.seen):
+            self.seen.extend(b"\x00" * (byte + 1 - len(self.seen)))
+        self.seen[byte] |= 1 << bit
+
+    def is_seen(self, index: int) -> bool:
+        byte, bit = divmod(index, 8)
+        return byte < len(self.seen) and bool(self.seen[byte] & (1 << bit))
+
+    @property
+    def seen_count(self) -> int:
+        return sum(bin(b).count("1") for b in self.seen)
+
+    def to_dict(self) -> Dict:
+        return {
+            "user_id": self.user_id,
+            "centroid": self.centroid.tolist() if self.centroid is not None else None,
+            "count": self.count,
+            "topics": self.topics,
+            "seen": base64.b64encode(bytes(self.seen)).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "UserProfile":
+        centroid = data.get("centroid")
+        return cls(
+            user_id=data["user_id"],
+            centroid=np.asarray(centroid, dtype=np.float32) if centroid is not None else None,
+            count=data.get("count", 0),
+            topics=data.get("topics", []),
+            seen=bytearray(base64.b64decode(data.get("seen", ""))),
+        )
+
+
+class ProfileStore:
+    def __init__(self, persist_dir: str, embed_fn: Callable[[List[str]], Iterable],
+                 max_cached: int = MAX_CACHED_PROFILES):
+        os.makedirs(persist_dir, exist_ok=True)
+        self.persist_dir = persist_dir
+        self.embed_fn = embed_fn
+        self.max_cached = max_cached
+        # LRU of loaded profiles, most recently used last.
+        self._profiles: "OrderedDict[str, UserProfile]" = OrderedDict()
+        # Guards the LRU and the concept index. Taken after a user lock, never before.
+        self._lock = threading.Lock()
+        self._user_locks = [threading.RLock() for _ in range(USER_LOCK_STRIPES)]
+
+        self._concepts_path = os.path.join(persist_dir, "_concepts.json")
+        self._concept_ids: Dict[str, int] = {}
+        if os.path.exists(self._concepts_path):
+            with open(self._concepts_path, 'r') as f:
+                self._concept_ids = json.load(f)
+
+    def _profile_path(self, user_id: str) -> str:
+        if not USER_ID_PATTERN.match(user_id):
+            raise ValueError(f"Invalid user id: {user_id!r}")
+        return os.path.join(self.persist_dir, f"{user_id}.json")
+
+    def _user_lock(self, user_id: str) -> threading.RLock:
+        return self._user_locks[hash(user_id) % len(self._user_locks)]
+
+    def _remember(self, profile: UserProfile):
+        self._profiles[profile.user_id] = profile
+        self._profiles.move_to_end(profile.user_id)
+        while len(self._profiles) > self.max_cached:
+            self._profiles.popitem(last=False)
+
+    def _save(self, profile: UserProfile):
+        # Callers hold the profile's user lock.
+        _write_json(self._profile_path(profile.user_id), profile.to_dict())
+        with self._lock:
+            self._remember(profile)
+
+    def concept_index(self, concept_id: str) -> int:
+        """Stable bit index for a concept id; new ids are appended, never renumbered."""
+        with self._lock:
+            index = self._concept_ids.get(concept_id)
+            if index is None:
+                index = len(self._concept_ids)
+                self._concept_ids[concept_id] = index
+                _write_json(self._concepts_path, self._concept_ids)
+            return index
+
+    def get(self, user_id: str) -> UserProfile:
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None:
+                self._profiles.move_to_end(user_id)
+                return profile
+
+            path = self._profile_path(user_id)
+            if not os.path.exists(path):
+                # Not cached until it is first saved, so unknown ids can't grow memory.
+                return UserProfile(user_id)
+            with open(path, 'r') as f:
+                profile = UserProfile.from_dict(json.load(f))
+            self._remember(profile)
+            return profile
+
+    def add_topics(self, user_id: str, topics: List[str]) -> UserProfile:
+        """Embeds only the topics this profile hasn't seen yet and updates its centroid."""
+        with self._user_lock(user_id):
+            profile = self.get(user_id)
+            known = set(profile.topics)
+            new_topics = [t for t in dict.fromkeys(topics) if t not in known]
+            return self._add_texts(profile, new_topics, new_topics)
+
+    def add_qa(self, user_id: str, qa_pairs: List[Dict[str, str]]) -> UserProfile:
+        with self._user_lock(user_id):
+            profile = self.get(user_id)
+            texts = [f"Q: {qa['question']}\nA: {qa['answer']}" for qa in qa_pairs]
+            return self._add_texts(profile, texts, [])
+
+    def _add_texts(self, profile: UserProfile, texts: List[str], topics: List[str]) -> UserProfile:
+        if not texts:
+            return profile
+        vectors = np.asarray(self.embed_fn(texts), dtype=np.float32)
+        profile.add_embeddings(vectors)
+        profile.topics.extend(topics)
+        self._save(profile)
+        return profile
+
+    def mark_seen(self, user_id: str, concept_id: str) -> UserProfile:
+        with self._user_lock(user_id):
+            profile = self.get(user_id)
+            profile.mark_seen(self.concept_index(concept_id))
+            self._save(profile)
+            return profile
+
+    def is_seen(self, profile: UserProfile, concept_id: str) -> bool:
+        index = self._concept_ids.get(concept_id)
+        return index is not None and profile.is_seen(index)
+
+    def recommend(self, engine, user_id: str) -> Optional[Dict]:
+        """
+        Next unseen Unknown Unknown for the profile (queried by its centroid), marked as seen.
+        Returns None once every concept has been shown. Raises LookupError for a profile
+        without any topics yet.
+        """
+        # Held across query and mark_seen so two concurrent calls never return the same concept.
+        with self._user_lock(user_id):
+            profile = self.get(user_id)
+            if profile.centroid is None:
+                raise LookupError("Profile has no topics yet.")
+
+            concept = engine.find_unknown_unknown(
+                profile.topics,
+                query_embedding=profile.centroid,
+                exclude=lambda concept_id: self.is_seen(profile, concept_id),
+            )
+            if concept is not None:
+                self.mark_seen(user_id, concept["name"])
+            return concept
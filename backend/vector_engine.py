@@ -2,7 +2,7 @@ import os
 import json
 import chromadb
 from chromadb.utils import embedding_functions
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 import sys
 
 # We need to decide which embedding function to use.
@@ -17,15 +17,16 @@ import sys
 # This is perfect for "The Vector Engine" Sprint 2 without needing an API key immediately.
 
 class VectorEngine:
-    def __init__(self, persist_path: str = "backend/chroma_db"):
+    def __init__(self, persist_path: str = "backend/chroma_db", embedding_fn=None):
         # Adjust path relative to where script is run
         if not os.path.exists(os.path.dirname(persist_path)) and os.path.dirname(persist_path):
              os.makedirs(os.path.dirname(persist_path), exist_ok=True)
 
         self.client = chromadb.PersistentClient(path=persist_path)
 
-        # Use default embedding function (all-MiniLM-L6-v2)
-        self.embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+        # Use default embedding function (all-MiniLM-L6-v2) unless one is injected,
+        # e.g. the offline hashing embedder used by scripts/vector_harness.py.
+        self.embedding_fn = embedding_fn or embedding_functions.DefaultEmbeddingFunction()
 
         self.collection = self.client.get_or_create_collection(
             name="unknown_unknowns",
@@ -48,7 +49,12 @@ class VectorEngine:
         )
         print(f"Ingested {len(concepts)} concepts into Vector Store.")
 
-    def find_unknown_unknown(self, user_topics: List[str], n_results: int = 5) -> Dict:
+    def embed(self, texts: List[str]) -> List:
+        return self.embedding_fn(texts)
+
+    def find_unknown_unknown(self, user_topics: List[str], n_results: int = 5,
+                             query_embedding: Optional[List[float]] = None,
+                             exclude: Optional[Callable[[str], bool]] = None) -> Dict:
         """
         Finds a concept that is distinct from user_topics.
         Strategy:
@@ -63,20 +69,38 @@ class VectorEngine:
         Better approach:
         Fetch a large set of random-ish high utility concepts, or fetch *all* and sort by distance descending.
         Since we have a small dataset (<100), we can fetch all.
-        """
 
-        # Combine user topics into a single query string for embedding
-        query_text = ", ".join(user_topics)
+        For personalized queries, pass a precomputed `query_embedding` (a profile centroid)
+        to skip embedding the topics, and `exclude` to drop concept ids already shown.
+        """
 
         # Fetch all items (limit 100 for now)
         count = self.collection.count()
         if count == 0:
             return None
 
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=min(count, 20)
-        )
+        n_query = min(count, 20)
+        while True:
+            if query_embedding is not None:
+                results = self.collection.query(
+                    query_embeddings=[[float(x) for x in query_embedding]],
+                    n_results=n_query
+                )
+            else:
+                # Combine user topics into a single query string for embedding
+                query_text = ", ".join(user_topics)
+                results = self.collection.query(
+                    query_texts=[query_text],
+                    n_results=n_query
+                )
+
+            if exclude is None or n_query == count:
+                break
+            # Keep widening the search until 20 unseen candidates remain (or we have everything).
+            unseen = sum(1 for concept_id in results['ids'][0] if not exclude(concept_id))
+            if unseen >= 20:
+                break
+            n_query = min(count, n_query * 2)
 
         # results['distances'] are typically cosine distance (lower is closer).
         # We want higher distance.
@@ -88,6 +112,10 @@ class VectorEngine:
 
         # Zip and sort by distance descending (Furthest first)
         combined = list(zip(ids, distances, metadatas))
+        if exclude is not None:
+            combined = [c for c in combined if not exclude(c[0])][:20]
+            if not combined:
+                return None
         combined.sort(key=lambda x: x[1], reverse=True)
 
         # Pick the furthest one that is 'high utility' (already filtered by ingestion mostly)